@@ -1,5 +1,7 @@
 import os
+from collections import Counter
 import psycopg2
+from psycopg2 import sql
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -45,26 +47,30 @@ def create_dynamic_table(fields, new_table_name):
         cur = conn.cursor()
 
         # Drop the table if it already exists
-        cur.execute(f"DROP TABLE IF EXISTS {new_table_name}")
+        cur.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(new_table_name)))
 
         # Track duplicate field names and resolve by appending an index
         field_definitions = []
-        field_name_count = {}
+        field_name_count = Counter()
 
         for field_name, field_type in fields:
-            # Handle duplicate field names by appending an index
-            if field_name in field_name_count:
-                field_name_count[field_name] += 1
-                field_name = f"{field_name}_{field_name_count[field_name]}"
-            else:
-                field_name_count[field_name] = 0
+            # Handle duplicate field names by appending how many times the name was seen before
+            seen = field_name_count[field_name]
+            field_name_count[field_name] += 1
+            if seen:
+                field_name = f"{field_name}_{seen}"
 
             # Map the field_type as it is stored in the PostgreSQL table
             pg_field_type = map_jira_type_to_pg(field_type)
-            field_definitions.append(f'"{field_name}" {pg_field_type}')
-
-        # Build the CREATE TABLE SQL statement
-        create_table_query = f"CREATE TABLE {new_table_name} ({', '.join(field_definitions)});"
+            field_definitions.append(
+                sql.SQL("{} {}").format(sql.Identifier(field_name), sql.SQL(pg_field_type))
+            )
+
+        # Build the CREATE TABLE SQL statement with properly quoted identifiers
+        create_table_query = sql.SQL("CREATE TABLE {} ({})").format(
+            sql.Identifier(new_table_name),
+            sql.SQL(', ').join(field_definitions)
+        )
         
         # Execute the table creation
         cur.execute(create_table_query)
@@ -1,6 +1,9 @@
 import os
-import json
+import io
+import csv
+import orjson
 import psycopg2
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from jira import JIRA
 from dotenv import load_dotenv
 from tqdm import tqdm  # Progress bar library
@@ -25,112 +28,168 @@ pg_conn_params = {
 # Connect to Jira
 jira = JIRA(server=jira_url, basic_auth=(jira_username, jira_token))
 
+# Every field is flattened downstream, so request them all but skip expansions
+# and ask for raw JSON instead of Issue objects
+search_options = {'fields': '*all', 'expand': None, 'json_result': True}
+
 # Function to fetch all issues with pagination
-def fetch_all_issues(jql_query="project=MSSCI ORDER BY created DESC", batch_size=100):
+def fetch_all_issues(jql_query="project=MSSCI ORDER BY created DESC", batch_size=100, max_workers=8):
     """
     Fetch all issues from Jira using pagination, handling large sets of issues.
+    After the first page reveals the total, the remaining pages are fetched concurrently.
+    Issues are returned as raw JSON, skipping the jira library's Issue objects.
     :param jql_query: The JQL query string to fetch issues.
     :param batch_size: Number of issues to retrieve per API request.
-    :return: List of all Jira issues.
+    :param max_workers: Number of pages to fetch in parallel.
+    :return: List of all Jira issues as raw JSON dicts.
     """
-    issues = []
-    start_at = 0
-    total_issues = 1  # Placeholder to enter the loop
-
     # Progress bar initialization
     with tqdm(desc="Fetching Jira Issues", unit="issues", leave=True) as pbar:
-        while start_at < total_issues:
-            batch = jira.search_issues(jql_query, startAt=start_at, maxResults=batch_size)
-            issues.extend(batch)
-            total_issues = batch.total  # Total number of issues based on the first response
-            start_at += len(batch)
-            pbar.update(len(batch))  # Update progress bar
+        # The first page tells us how many issues there are in total
+        first_page = jira.search_issues(jql_query, startAt=0, maxResults=batch_size, **search_options)
+        total_issues = first_page['total']
+        first_batch = first_page['issues']
+        pbar.update(len(first_batch))  # Update progress bar
+
+        # Step by the page size the server actually returned, in case it caps maxResults
+        page_size = len(first_batch)
+        if page_size == 0:
+            return []
+        batches = {0: first_batch}
+
+        # Fetch the remaining pages concurrently
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(jira.search_issues, jql_query, startAt=start_at, maxResults=page_size, **search_options): start_at
+                for start_at in range(page_size, total_issues, page_size)
+            }
+            for future in as_completed(futures):
+                batch = future.result()
+                batches[futures[future]] = batch['issues']
+                pbar.update(len(batch['issues']))  # Update progress bar
+
+    # Reassemble the pages in query order
+    issues = []
+    for start_at in sorted(batches):
+        issues.extend(batches[start_at])
     return issues
 
-# Function to transform field names: replace spaces with underscores and prepend 'mss_'
-def transform_field_name(field_name):
-    return f"mss_{field_name.lower().replace(' ', '_')}"
-
-# Recursive function to flatten and insert JSON data
-def flatten_json_and_insert(issue_key, data, parent_key='', counter=0):
+# Server-side flattening: walk every issue's JSONB recursively and emit one row per leaf.
+# Keys are joined with '_' and list items use their index, matching the old Python flattener,
+# and field names are transformed by lowercasing, replacing spaces with underscores and prepending 'mss_'.
+flatten_query = """
+    WITH RECURSIVE flattened (issue_key, field_id, field_value) AS (
+        SELECT r.issue_key, e.key, e.value
+        FROM jira_raw r, jsonb_each(r.fields) AS e(key, value)
+        UNION ALL
+        SELECT f.issue_key, f.field_id || '_' || c.key, c.value
+        FROM flattened f
+        CROSS JOIN LATERAL (
+            SELECT o.key, o.value
+            FROM jsonb_each(
+                CASE WHEN jsonb_typeof(f.field_value) = 'object' THEN f.field_value END
+            ) AS o(key, value)
+            UNION ALL
+            SELECT (a.idx - 1)::text, a.value
+            FROM jsonb_array_elements(
+                CASE WHEN jsonb_typeof(f.field_value) = 'array' THEN f.field_value END
+            ) WITH ORDINALITY AS a(value, idx)
+        ) c
+    )
+    INSERT INTO jira_fields_2 (issue_key, field_id, field_name, field_value)
+    SELECT DISTINCT ON (issue_key, field_id)
+        issue_key, field_id, 'mss_' || lower(replace(field_id, ' ', '_')), field_value
+    FROM flattened
+    WHERE jsonb_typeof(field_value) NOT IN ('object', 'array')
+    ORDER BY issue_key, field_id
+"""
+
+# Function to bulk load issues into 'jira_fields_2', flattening them inside PostgreSQL
+def copy_issues_into_jira_fields_table(cur, raw_issues):
     """
-    Recursively flatten a nested JSON structure and insert each key-value pair into the PostgreSQL table.
+    Stream one (issue_key, fields) row per issue into a temporary 'jira_raw' table with a single COPY,
+    then flatten the JSONB server-side into 'jira_fields_2' keeping one row per (issue_key, field_id) pair.
     """
-    conn = psycopg2.connect(**pg_conn_params)
-    cur = conn.cursor()
-
-    if isinstance(data, dict):
-        for key, value in data.items():
-            new_key = f"{parent_key}_{key}" if parent_key else key  # Create new key
-            flatten_json_and_insert(issue_key, value, new_key)
-    elif isinstance(data, list):
-        for i, item in enumerate(data):
-            new_key = f"{parent_key}_{i}"  # Add the index of the list as a suffix to ensure uniqueness
-            flatten_json_and_insert(issue_key, item, new_key)
-    else:
-        # Add a counter suffix to field_id if it already exists to avoid duplicate key errors
-        insert_query = """
-            INSERT INTO jira_fields_2 (issue_key, field_id, field_name, field_value)
-            VALUES (%s, %s, %s, %s)
-        """
-        try:
-            cur.execute(insert_query, (issue_key, parent_key, transform_field_name(parent_key), json.dumps(data)))
-        except psycopg2.errors.UniqueViolation:
-            # If there's a duplicate key error, append a unique counter to the key
-            new_key_with_counter = f"{parent_key}_{counter}"
-            cur.execute(insert_query, (issue_key, new_key_with_counter, transform_field_name(parent_key), json.dumps(data)))
-            counter += 1
-
-    conn.commit()
-    cur.close()
-    conn.close()
-
-# Function to create a PostgreSQL table 'jira_fields_2'
-def create_jira_fields_table():
-    try:
-        conn = psycopg2.connect(**pg_conn_params)
-        cur = conn.cursor()
-
-        # Drop table if it exists
-        print("Dropping existing table if it exists...")
-        cur.execute("DROP TABLE IF EXISTS jira_fields_2")
-        conn.commit()
-
-        # Build a SQL query to create the table based on the field names and types
-        print("Creating new table 'jira_fields_2'...")
-        create_table_query = """
-            CREATE TABLE jira_fields_2 (
-                issue_key TEXT,
-                field_id TEXT,
-                field_name TEXT,
-                field_value JSONB,
-                PRIMARY KEY (issue_key, field_id)
-            )
-        """
-        cur.execute(create_table_query)
-        conn.commit()
-
-        print("Table 'jira_fields_2' created successfully.")
-
-        cur.close()
-        conn.close()
-    except Exception as e:
-        print(f"Error creating 'jira_fields_2' table: {e}")
+    buf = io.StringIO()
+    writer = csv.writer(buf, delimiter='\t', quoting=csv.QUOTE_MINIMAL)
+    writer.writerows(
+        (issue_key, orjson.dumps(issue_fields).decode())
+        for issue_key, issue_fields in raw_issues.items()
+    )
+    buf.seek(0)
+
+    cur.execute("""
+        CREATE TEMP TABLE jira_raw (
+            issue_key TEXT PRIMARY KEY,
+            fields JSONB
+        ) ON COMMIT DROP
+    """)
+    cur.copy_expert(
+        "COPY jira_raw (issue_key, fields) FROM STDIN WITH (FORMAT csv, DELIMITER E'\\t')",
+        buf
+    )
+    cur.execute(flatten_query)
+    return cur.rowcount
+
+# Function to (re)create the PostgreSQL table 'jira_fields_2' inside the caller's transaction
+def create_jira_fields_table(cur):
+    """
+    Drop and recreate 'jira_fields_2' without committing, so a failed load rolls back
+    to the previous table instead of leaving an empty one behind.
+    """
+    # Drop table if it exists
+    print("Dropping existing table if it exists...")
+    cur.execute("DROP TABLE IF EXISTS jira_fields_2")
+
+    # Build a SQL query to create the table based on the field names and types.
+    # The table starts UNLOGGED so the bulk load skips WAL; it is set LOGGED once loaded.
+    # The primary key is added after the load so it's built once instead of row by row.
+    print("Creating new table 'jira_fields_2'...")
+    create_table_query = """
+        CREATE UNLOGGED TABLE jira_fields_2 (
+            issue_key TEXT,
+            field_id TEXT,
+            field_name TEXT,
+            field_value JSONB
+        )
+    """
+    cur.execute(create_table_query)
 
 if __name__ == '__main__':
     # Fetch all issues
     issues = fetch_all_issues()
 
     if issues:
-        # Create the PostgreSQL table
-        create_jira_fields_table()
-
-        # Loop through each issue and flatten its fields for insertion
-        for issue in tqdm(issues, desc="Processing Jira Issues", unit="issue"):  # Progress bar added
-            issue_key = issue.key
-            issue_fields = issue.raw['fields']
-            
-            # Flatten the issue fields and insert them into the table
-            flatten_json_and_insert(issue_key, issue_fields, parent_key='', counter=0)
+        # Key raw fields by issue so a page that shifted during fetching can't duplicate an issue
+        raw_issues = {issue['key']: issue['fields'] for issue in issues}
+
+        # Load all issues in one COPY and let PostgreSQL flatten them
+        conn = psycopg2.connect(**pg_conn_params)
+        cur = conn.cursor()
+        try:
+            # Don't wait for WAL flushes during the load; the table is made durable at the end
+            cur.execute("SET synchronous_commit TO off")
+            # Give sorts and hashes during the load more memory before spilling to disk
+            cur.execute("SET work_mem TO '256MB'")
+
+            # Recreate the table in the same transaction as the load so both commit or roll back together
+            create_jira_fields_table(cur)
+
+            row_count = copy_issues_into_jira_fields_table(cur, raw_issues)
+
+            # Restore crash-safety now that the data is in place.
+            # Done before adding the primary key, since SET LOGGED rewrites the table and rebuilds its indexes.
+            cur.execute("ALTER TABLE jira_fields_2 SET LOGGED")
+
+            # Build the primary key index in one pass over the loaded rows
+            cur.execute("ALTER TABLE jira_fields_2 ADD PRIMARY KEY (issue_key, field_id)")
+            conn.commit()
+            print(f"Loaded {row_count} rows for {len(raw_issues)} issues into 'jira_fields_2'.")
+        except Exception as e:
+            conn.rollback()
+            print(f"Error loading 'jira_fields_2' table: {e}")
+        finally:
+            cur.close()
+            conn.close()
     else:
         print("No issues to insert.")
\ No newline at end of file
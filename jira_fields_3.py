@@ -1,7 +1,11 @@
 import os
-import json
-import psycopg2
+import string
+import asyncio
+import orjson
+import psycopg
 import logging
+from collections import deque
+from functools import lru_cache
 from jira import JIRA
 from dotenv import load_dotenv
 from tqdm import tqdm  # Progress bar library
@@ -29,91 +33,109 @@ pg_conn_params = {
 # Connect to Jira
 jira = JIRA(server=jira_url, basic_auth=(jira_username, jira_token))
 
-# Function to fetch all issues with pagination
-def fetch_all_issues(jql_query="project=MSSCI ORDER BY created DESC", batch_size=100):
+# Every field is flattened downstream, so request them all but skip expansions
+# and ask for raw JSON instead of Issue objects
+search_options = {'fields': '*all', 'expand': None, 'json_result': True}
+
+# Maximum number of concurrent Jira page fetches and database connections
+max_concurrency = 10
+
+# Function to fetch a single page of issues without blocking the event loop
+async def fetch_issue_page(jql_query, start_at, batch_size):
     """
-    Fetch all issues from Jira using pagination, handling large sets of issues.
+    Fetch one page of issues from Jira in a worker thread.
     :param jql_query: The JQL query string to fetch issues.
-    :param batch_size: Number of issues to retrieve per API request.
-    :return: List of all Jira issues.
+    :param start_at: Offset of the first issue in the page.
+    :param batch_size: Number of issues to retrieve in the request.
+    :return: Raw JSON search result with 'issues' and 'total'.
     """
-    issues = []
-    start_at = 0
-    total_issues = 1  # Placeholder to enter the loop
-
-    # Progress bar initialization
-    with tqdm(desc="Fetching Jira Issues", unit="issues", leave=True) as pbar:
-        while start_at < total_issues:
-            try:
-                batch = jira.search_issues(jql_query, startAt=start_at, maxResults=batch_size)
-                issues.extend(batch)
-                total_issues = batch.total  # Total number of issues based on the first response
-                start_at += len(batch)
-                pbar.update(len(batch))  # Update progress bar
-            except Exception as e:
-                logging.error(f"Error fetching issues: {e}")
-                break
-    return issues
+    return await asyncio.to_thread(
+        jira.search_issues, jql_query, startAt=start_at, maxResults=batch_size, **search_options
+    )
+
+# Translation table that lowercases ASCII letters and replaces spaces with underscores in one pass
+field_name_table = str.maketrans(string.ascii_uppercase + ' ', string.ascii_lowercase + '_')
 
 # Function to transform field names: replace spaces with underscores and prepend 'mss_'
+# Cached because the same field names repeat across issues
+@lru_cache(maxsize=8192)
 def transform_field_name(field_name):
-    return f"mss_{field_name.lower().replace(' ', '_')}"
+    return "mss_" + field_name.translate(field_name_table)
 
-# Function to check if a field exists and if the value has changed
-def check_and_update_field(cur, issue_key, field_id, new_field_value):
+# Function to insert new fields and update changed ones in a single statement
+async def check_and_update_fields(cur, issue_key, fields):
     """
-    Check if the field exists and if the value has changed.
-    If the value has changed, update the record. Otherwise, skip.
+    Upsert all flattened fields of an issue without waiting on each row's result.
+    Existing records are only updated when the value has changed; unchanged ones are skipped.
+    Results are kept on the cursor so log_updated_fields can read them once the pipeline syncs.
     """
-    # Query to check if the field exists in the database
-    check_query = """
-        SELECT field_value FROM jira_fields_2
-        WHERE issue_key = %s AND field_id = %s
+    upsert_query = """
+        INSERT INTO jira_fields_2 (issue_key, field_id, field_name, field_value)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (issue_key, field_id) DO UPDATE
+        SET field_value = EXCLUDED.field_value
+        WHERE jira_fields_2.field_value IS DISTINCT FROM EXCLUDED.field_value
+        RETURNING field_id, (xmax <> 0) AS updated
     """
-    cur.execute(check_query, (issue_key, field_id))
-    result = cur.fetchone()
-
-    # If field exists, check if the value has changed
-    if result:
-        current_value = result[0]
-        if current_value != new_field_value:  # Compare old value with new value
-            update_query = """
-                UPDATE jira_fields_2
-                SET field_value = %s
-                WHERE issue_key = %s AND field_id = %s
-            """
-            cur.execute(update_query, (new_field_value, issue_key, field_id))
-            logging.info(f"{issue_key}:Updated {field_id} for issue {issue_key}")
-    else:
-        # Insert new record
-        insert_query = """
-            INSERT INTO jira_fields_2 (issue_key, field_id, field_name, field_value)
-            VALUES (%s, %s, %s, %s)
-        """
-        cur.execute(insert_query, (issue_key, field_id, transform_field_name(field_id), new_field_value))
+    rows = [
+        (issue_key, field_id, transform_field_name(field_id), new_field_value)
+        for field_id, new_field_value in fields.items()
+    ]
+    # Inside a pipeline executemany queues every row back-to-back in one batch
+    await cur.executemany(upsert_query, rows, returning=True)
 
-# Recursive function to flatten and insert/update JSON data
-def flatten_json_and_insert(issue_key, data, parent_key='', cur=None):
+# Function to log the fields whose value changed, from the upsert's RETURNING rows
+async def log_updated_fields(cur, issue_key):
     """
-    Recursively flatten a nested JSON structure and insert/update each key-value pair into the PostgreSQL table.
+    Walk the result sets of the upsert batch and log every existing field that was updated.
+    Must be called after the pipeline has synced, so fetching doesn't stall it.
     """
-    if isinstance(data, dict):
-        for key, value in data.items():
-            new_key = f"{parent_key}_{key}" if parent_key else key  # Create new key
-            flatten_json_and_insert(issue_key, value, new_key, cur)
-    elif isinstance(data, list):
-        for i, item in enumerate(data):
-            new_key = f"{parent_key}_{i}"  # Add the index of the list as a suffix to ensure uniqueness
-            flatten_json_and_insert(issue_key, item, new_key, cur)
-    else:
-        # Handle non-dict and non-list values by checking and updating
-        new_field_value = json.dumps(data) if data is not None else None
-        check_and_update_field(cur, issue_key, parent_key, new_field_value)
+    while True:
+        for field_id, updated in await cur.fetchall():
+            if updated:
+                logging.info(f"{issue_key}:Updated {field_id} for issue {issue_key}")
+        if not cur.nextset():
+            break
+
+# Iterative function to flatten JSON data into a field_id -> value mapping
+def flatten_json(data):
+    """
+    Flatten a nested JSON structure using an explicit stack into a dict of field_id to JSON-encoded value.
+    """
+    fields = {}
+    stack = deque([(data, '')])
+    while stack:
+        data, parent_key = stack.pop()
+        if isinstance(data, dict):
+            # Push children in reverse so they are visited in their original order
+            stack.extend(
+                (value, f"{parent_key}_{key}" if parent_key else key)  # Create new key
+                for key, value in reversed(data.items())
+            )
+        elif isinstance(data, list):
+            # Add the index of the list as a suffix to ensure uniqueness
+            stack.extend((data[i], f"{parent_key}_{i}") for i in reversed(range(len(data))))
+        else:
+            # Keyed by field_id so a colliding key can't hit the same row twice in one upsert
+            fields[parent_key] = orjson.dumps(data).decode() if data is not None else None
+
+    return fields
+
+# Function to flatten an issue and insert/update its fields
+async def flatten_json_and_insert(issue_key, data, cur):
+    """
+    Flatten a nested JSON structure and insert/update each key-value pair into the PostgreSQL table.
+    :return: True if any fields were sent, i.e. the cursor has results to read.
+    """
+    fields = flatten_json(data)
+    if fields:
+        await check_and_update_fields(cur, issue_key, fields)
+    return bool(fields)
 
 # Function to create a PostgreSQL table 'jira_fields_2' if it doesn't exist
 def create_jira_fields_table():
     try:
-        conn = psycopg2.connect(**pg_conn_params)
+        conn = psycopg.connect(**pg_conn_params)
         cur = conn.cursor()
 
         # Create the table only if it doesn't exist
@@ -137,37 +159,102 @@ def create_jira_fields_table():
     except Exception as e:
         logging.error(f"Error ensuring 'jira_fields_2' table: {e}")
 
-if __name__ == '__main__':
-    # Fetch all issues
-    issues = fetch_all_issues()
+# Function to open a connection tuned for bulk loading
+async def connect_for_loading():
+    conn = await psycopg.AsyncConnection.connect(**pg_conn_params)
 
-    if issues:
-        # Create the PostgreSQL table if it doesn't exist
-        create_jira_fields_table()
+    try:
+        # Don't wait for WAL flushes on each commit and allow larger sorts for this session
+        await conn.execute("SET synchronous_commit TO off")
+        await conn.execute("SET work_mem TO '256MB'")
+        await conn.commit()
+    except Exception:
+        await conn.close()
+        raise
+    return conn
 
-        # Open a database connection
-        conn = psycopg2.connect(**pg_conn_params)
-        cur = conn.cursor()
+# Function to process one issue on a connection borrowed from the queue
+async def process_issue(conn_queue, issue, pbar):
+    """
+    Flatten an issue and upsert its fields in a pipeline, committing once the issue is written.
+    """
+    conn = await conn_queue.get()
+    try:
+        async with conn.cursor() as cur:
+            async with conn.pipeline():
+                written = await flatten_json_and_insert(issue['key'], issue['fields'], cur)
 
+            # The pipeline has synced on exit, so the RETURNING rows can be read without stalling it
+            if written:
+                await log_updated_fields(cur, issue['key'])
+        await conn.commit()
+    except Exception as e:
+        await conn.rollback()
+        logging.error(f"Error processing issue {issue['key']}: {e}")
+    finally:
+        conn_queue.put_nowait(conn)
+        pbar.update(1)  # Update progress bar
+
+# Function to process all issues of a page concurrently
+async def process_issues(conn_queue, issues, pbar):
+    await asyncio.gather(*(process_issue(conn_queue, issue, pbar) for issue in issues))
+
+# Function to fetch a page and process its issues as soon as it arrives
+async def fetch_and_process_page(conn_queue, fetch_semaphore, jql_query, start_at, batch_size, pbar):
+    async with fetch_semaphore:
         try:
-            # Loop through each issue and flatten its fields for insertion
-            for i, issue in enumerate(tqdm(issues, desc="Processing Jira Issues", unit="issue")):
-                issue_key = issue.key
-                issue_fields = issue.raw['fields']
-                
-                # Flatten the issue fields and insert/update them into the table
-                flatten_json_and_insert(issue_key, issue_fields, parent_key='', cur=cur)
-
-                # Commit every 100 issues
-                if i % 100 == 0:
-                    conn.commit()
-
-            # Final commit for any remaining issues
-            conn.commit()
+            page = await fetch_issue_page(jql_query, start_at, batch_size)
         except Exception as e:
-            logging.error(f"Error processing issues: {e}")
-        finally:
-            cur.close()
-            conn.close()
-    else:
-        logging.info("No issues to insert.")
\ No newline at end of file
+            logging.error(f"Error fetching issues at offset {start_at}: {e}")
+            return
+    await process_issues(conn_queue, page['issues'], pbar)
+
+# Function to fetch and process all issues, overlapping Jira requests with database writes
+async def process_all_issues(jql_query="project=MSSCI ORDER BY created DESC", batch_size=100):
+    """
+    Fetch all issues from Jira page by page and upsert them into PostgreSQL concurrently.
+    After the first page reveals the total, the remaining pages are fetched while earlier issues are written.
+    :param jql_query: The JQL query string to fetch issues.
+    :param batch_size: Number of issues to retrieve per API request.
+    """
+    # The first page tells us how many issues there are in total
+    try:
+        first_page = await fetch_issue_page(jql_query, 0, batch_size)
+    except Exception as e:
+        logging.error(f"Error fetching issues: {e}")
+        return
+    total_issues = first_page['total']
+    first_batch = first_page['issues']
+
+    # Step by the page size the server actually returned, in case it caps maxResults
+    page_size = len(first_batch)
+    if page_size == 0:
+        logging.info("No issues to insert.")
+        return
+
+    # Create the PostgreSQL table if it doesn't exist
+    create_jira_fields_table()
+
+    conn_queue = asyncio.Queue()
+    fetch_semaphore = asyncio.Semaphore(max_concurrency)
+
+    try:
+        # Open a fixed set of connections that issue coroutines borrow and return.
+        # Opened inside the try so a failed connect still closes the ones already open.
+        for _ in range(max_concurrency):
+            conn_queue.put_nowait(await connect_for_loading())
+
+        with tqdm(total=total_issues, desc="Processing Jira Issues", unit="issue") as pbar:
+            await asyncio.gather(
+                process_issues(conn_queue, first_batch, pbar),
+                *(
+                    fetch_and_process_page(conn_queue, fetch_semaphore, jql_query, start_at, page_size, pbar)
+                    for start_at in range(page_size, total_issues, page_size)
+                )
+            )
+    finally:
+        while not conn_queue.empty():
+            await conn_queue.get_nowait().close()
+
+if __name__ == '__main__':
+    asyncio.run(process_all_issues())
\ No newline at end of file
@@ -1,6 +1,8 @@
+import io
 import json
 from jira import JIRA
 import psycopg2
+from psycopg2 import sql
 import os
 from dotenv import load_dotenv
 from tqdm import tqdm
@@ -28,8 +30,17 @@ allowed_projects = ['TO', 'CCMP', 'CLIP', 'CREMA', 'INFRA', 'ISD', 'MSSCI']
 # Connect to Jira
 jira = JIRA(server=jira_url, basic_auth=(jira_username, jira_token))
 
+# Cached field_id to field_name mappings, loaded from PostgreSQL on first use
+field_mappings_cache = None
+
 # Function to get field_id to field_name mappings from the jira_fields table
 def get_jira_fields_mapping():
+    global field_mappings_cache
+
+    # Reuse the mappings from a previous call instead of re-querying
+    if field_mappings_cache is not None:
+        return field_mappings_cache
+
     try:
         conn = psycopg2.connect(**pg_conn_params)
         cur = conn.cursor()
@@ -40,6 +51,8 @@ def get_jira_fields_mapping():
 
         cur.close()
         conn.close()
+
+        field_mappings_cache = field_mappings
         return field_mappings
 
     except Exception as e:
@@ -67,30 +80,57 @@ def handle_complex_field(field_name, value):
 
 # Function to properly quote column names
 def quote_column_name(column_name):
-    return f'"{column_name}"'
-
-# Function to insert data into dynamic_jira_table
-def insert_into_dynamic_jira_table(issue_data):
-    try:
-        conn = psycopg2.connect(**pg_conn_params)
-        cur = conn.cursor()
-
-        # Quote column names that may have special characters or spaces
-        columns = ', '.join([quote_column_name(col) for col in issue_data.keys()])
-        values = ', '.join(['%s'] * len(issue_data))
-        insert_query = f"INSERT INTO dynamic_jira_table ({columns}) VALUES ({values})"
-
-        # Adapt issue data to handle complex types (convert to JSONB or handle arrays)
-        adapted_issue_data = [handle_complex_field(field_name, value) for field_name, value in issue_data.items()]
-
-        cur.execute(insert_query, adapted_issue_data)
-        conn.commit()
-
-        cur.close()
-        conn.close()
-
-    except Exception as e:
-        print(f"Error inserting data into dynamic_jira_table: {e}")
+    return sql.Identifier(column_name)
+
+# PostgreSQL truncates identifiers to NAMEDATALEN - 1 bytes
+max_identifier_bytes = 63
+
+# Function to truncate a name the way PostgreSQL does for identifiers, without splitting a UTF-8 character
+def truncate_identifier(name):
+    return name.encode('utf-8')[:max_identifier_bytes].decode('utf-8', 'ignore')
+
+# Function to get the column names of dynamic_jira_table in table order
+def get_dynamic_table_columns(cur):
+    # Resolve the table through search_path exactly as COPY will, ignoring same-named tables in other schemas
+    cur.execute("""
+        SELECT attname FROM pg_attribute
+        WHERE attrelid = 'dynamic_jira_table'::regclass
+          AND attnum > 0 AND NOT attisdropped
+        ORDER BY attnum
+    """)
+    return tuple(row[0] for row in cur.fetchall())
+
+# Function to format a single array element for a PostgreSQL array literal
+def format_array_element(item):
+    if item is None:
+        return 'NULL'
+    if isinstance(item, bool):
+        item = 'true' if item else 'false'
+    # Quote every element so commas, braces and spaces survive
+    return '"' + str(item).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+# Function to format a value for PostgreSQL's COPY text format
+def format_copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        value = 'true' if value else 'false'
+    elif isinstance(value, list):
+        # Lists of scalars become PostgreSQL array literals
+        value = '{' + ','.join(format_array_element(item) for item in value) + '}'
+    else:
+        value = str(value)
+    # Escape the characters COPY treats specially
+    return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+# Function to load a project's buffered TSV rows into dynamic_jira_table with one COPY
+def copy_into_dynamic_jira_table(cur, columns, buf):
+    # Quote column names that may have special characters or spaces
+    copy_query = sql.SQL("COPY dynamic_jira_table ({}) FROM STDIN").format(
+        sql.SQL(', ').join([quote_column_name(col) for col in columns])
+    )
+    buf.seek(0)
+    cur.copy_expert(copy_query.as_string(cur), buf)
 
 # Function to get issues from a specific project
 def get_issues_from_project(project_key):
@@ -117,33 +157,79 @@ def get_issues_from_allowed_projects():
     for project in filtered_projects:
         print(f"Project Name: {project.name}, Project Key: {project.key}")
 
-    # Initialize tqdm progress bar for projects
-    with tqdm(total=total_projects, desc="Processing Jira Projects") as project_pbar:
-        for project in filtered_projects:
-            project_key = project.key
-            issues = get_issues_from_project(project_key)
-            
-            if issues:
-                # Initialize tqdm progress bar for issues within the project
-                with tqdm(total=len(issues), desc=f"Processing issues for project {project_key}") as issue_pbar:
-                    for issue in issues:
-                        issue_data = {}
-
-                        # Map each field_id to field_name and prepare data for insertion
-                        for field_id, value in issue.raw['fields'].items():
-                            if field_id in field_mappings:
-                                field_name = field_mappings[field_id]
-                                issue_data[field_name] = value
-
-                        # Insert mapped data into the dynamic_jira_table
-                        if issue_data:
-                            insert_into_dynamic_jira_table(issue_data)
-
-                        # Update the progress bar for issues
-                        issue_pbar.update(1)
-            
-            # Update the progress bar for projects
-            project_pbar.update(1)
+    # Open a single database connection for all inserts
+    conn = psycopg2.connect(**pg_conn_params)
+    cur = conn.cursor()
+
+    # Bulk refresh session: don't wait for WAL flushes on each commit and allow larger sorts
+    cur.execute("SET synchronous_commit TO off")
+    cur.execute("SET work_mem TO '256MB'")
+    # Commit so a later rollback of a failed project doesn't undo the session settings
+    conn.commit()
+
+    try:
+        # Pair each mapped table column with the field_id that fills it, in table order.
+        # Column names come back truncated by PostgreSQL, so match on the truncated field name.
+        field_ids_by_name = {
+            truncate_identifier(field_name): field_id for field_id, field_name in field_mappings.items()
+        }
+        table_columns = get_dynamic_table_columns(cur)
+        column_field_ids = [
+            (column, field_ids_by_name[column])
+            for column in table_columns
+            if column in field_ids_by_name
+        ]
+
+        # Report mapped fields that have no column instead of silently leaving them empty
+        unmatched_names = sorted(set(field_ids_by_name) - set(table_columns))
+        if unmatched_names:
+            print(f"No column in dynamic_jira_table for fields: {', '.join(unmatched_names)}")
+
+        if not column_field_ids:
+            print("No mapped columns found in dynamic_jira_table.")
+            return
+        columns = tuple(column for column, _ in column_field_ids)
+
+        # Initialize tqdm progress bar for projects
+        with tqdm(total=total_projects, desc="Processing Jira Projects") as project_pbar:
+            for project in filtered_projects:
+                project_key = project.key
+                issues = get_issues_from_project(project_key)
+
+                if issues:
+                    # Buffer one TSV row per issue and load the whole project in one COPY
+                    buf = io.StringIO()
+                    row_count = 0
+
+                    # Initialize tqdm progress bar for issues within the project
+                    with tqdm(total=len(issues), desc=f"Processing issues for project {project_key}") as issue_pbar:
+                        for issue in issues:
+                            issue_fields = issue.raw['fields']
+
+                            # Map each column to its field and adapt complex types (convert to JSONB or handle arrays)
+                            if any(field_id in issue_fields for _, field_id in column_field_ids):
+                                buf.write('\t'.join(
+                                    format_copy_value(handle_complex_field(field_name, issue_fields.get(field_id)))
+                                    for field_name, field_id in column_field_ids
+                                ) + '\n')
+                                row_count += 1
+
+                            # Update the progress bar for issues
+                            issue_pbar.update(1)
+
+                    if row_count:
+                        try:
+                            copy_into_dynamic_jira_table(cur, columns, buf)
+                            conn.commit()
+                        except Exception as e:
+                            conn.rollback()
+                            print(f"Error inserting data for project '{project_key}' into dynamic_jira_table: {e}")
+
+                # Update the progress bar for projects
+                project_pbar.update(1)
+    finally:
+        cur.close()
+        conn.close()
 
 if __name__ == '__main__':
     get_issues_from_allowed_projects()
\ No newline at end of file